@@ -1,14 +1,19 @@
 import asyncio
 import aiohttp
+import atexit
 import logging
+import logging.handlers
+import orjson
 import os
+import queue
 import time
 
-from datetime import datetime
+from operator import attrgetter
+from urllib.parse import quote, quote_plus
 from dataclasses import dataclass
 from collections import defaultdict
 
-from flask import Flask, jsonify
+from quart import Quart
 from dotenv import load_dotenv
 
 # Note: Adding `TODO(developer)`` is a personal practice
@@ -19,20 +24,42 @@ load_dotenv()
 
 # Setup logging
 # TODO(developer): Adjust logging configuration as needed
+# Records go through a queue and are written by a background thread,
+# so file and console I/O never blocks the event loop.
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    log_queue, logging.FileHandler("app.log"), logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("app.log"), logging.StreamHandler()],
+    handlers=[logging.handlers.QueueHandler(log_queue)],
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 NUM_MAX_REQUESTS = 10
 DEFAULT_TIME_WINDOW_SECS = 60
-
-
-@dataclass
+REQUEST_TIMEOUT_SECS = 15
+# Weather changes slowly, so successful responses are reused for a while
+CACHE_TTL_SECS = 300
+
+# Connection pool tuned for a single upstream host (OpenWeatherMap)
+# TODO(developer): Adjust if more APIs are added
+CONNECTOR_LIMIT = 200
+CONNECTOR_LIMIT_PER_HOST = 50
+DNS_CACHE_TTL_SECS = 600
+KEEPALIVE_TIMEOUT_SECS = 75
+# In-flight upstream calls. Today the per-city in-flight fetches are the real
+# cap (one call per city, 3 cities), so this only takes effect once the city
+# list grows past it.
+MAX_CONCURRENT_UPSTREAM_REQUESTS = 5
+
+
+@dataclass(slots=True)
 class WeatherData:
     """Data class for weather information."""
 
@@ -51,10 +78,27 @@ class WeatherData:
     error: str | None = None
 
 
+# Fields exposed by the API, `error` is kept internal
+PUBLIC_FIELDS = (
+    "city",
+    "temperature",
+    "description",
+    "humidity",
+    "pressure",
+    "wind_speed",
+    "country",
+    "timestamp",
+)
+get_public_fields = attrgetter(*PUBLIC_FIELDS)
+
+
 class RateLimiter:
-    """Simple rate limiter implementation."""
+    """Token bucket rate limiter.
 
-    # Note: Due to time constraints, I took this part from a template.
+    Each key holds a bucket of up to `max_requests` tokens that refills
+    continuously over `time_window` seconds, so bursts are allowed
+    while keeping the long-run rate. Only two floats are stored per key.
+    """
 
     def __init__(
         self,
@@ -63,23 +107,29 @@ class RateLimiter:
     ):
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = defaultdict(list)
+        self.refill_rate = max_requests / time_window  # Tokens per second
+        # Each bucket is [tokens, last_refill]
+        self.buckets = defaultdict(lambda: [float(max_requests), time.monotonic()])
+        self._lock = asyncio.Lock()
 
-    def is_allowed(self, key: str = "default") -> bool:
+    async def is_allowed(self, key: str = "default") -> bool:
         """Validate if current request is allowed based on rate limit."""
-        now = time.time()
-
-        # Clean old requests
-        self.requests[key] = [
-            req_time
-            for req_time in self.requests[key]
-            if now - req_time < self.time_window
-        ]
+        # The check and the consume must not interleave between coroutines
+        async with self._lock:
+            bucket = self.buckets[key]
+            # Monotonic clock is immune to wall-clock jumps
+            now = time.monotonic()
+
+            # Refill tokens for the time elapsed since the last check
+            bucket[0] = min(
+                self.max_requests, bucket[0] + (now - bucket[1]) * self.refill_rate
+            )
+            bucket[1] = now
 
-        if len(self.requests[key]) < self.max_requests:
-            self.requests[key].append(now)
-            return True
-        return False
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            return False
 
 
 class WeatherService:
@@ -88,139 +138,182 @@ class WeatherService:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
+        # Only the city changes between calls, so the rest of the query
+        # string is encoded once
+        self._url_prefix = f"{self.base_url}?appid={quote(api_key)}&units=metric&q="
         self.rate_limiter = RateLimiter(
             max_requests=NUM_MAX_REQUESTS, time_window=DEFAULT_TIME_WINDOW_SECS
         )
         self.timeout = aiohttp.ClientTimeout(total=10)
+        # Shared session so every request reuses pooled keep-alive connections
+        self.connector: aiohttp.TCPConnector | None = None
+        self.session: aiohttp.ClientSession | None = None
+        # City -> (fetched_at, data), using the monotonic clock
+        self._cache: dict[str, tuple[float, WeatherData]] = {}
+        # City -> in-flight fetch, so concurrent misses share one upstream
+        # call and its result, whether it succeeds or fails
+        self._in_flight: dict[str, asyncio.Task[WeatherData]] = {}
+        # Guards against a longer city list, see MAX_CONCURRENT_UPSTREAM_REQUESTS
+        self._upstream_semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPSTREAM_REQUESTS)
+
+    async def start(self) -> None:
+        """Create the shared HTTP session. Must run on the app event loop."""
+        if self.session is None or self.session.closed:
+            # The connector is bound to the running loop, so it is built here
+            # rather than in __init__
+            self.connector = aiohttp.TCPConnector(
+                # Non-blocking DNS via c-ares (aiodns) instead of a thread pool
+                resolver=aiohttp.AsyncResolver(),
+                limit=CONNECTOR_LIMIT,
+                limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+                use_dns_cache=True,
+                ttl_dns_cache=DNS_CACHE_TTL_SECS,
+                keepalive_timeout=KEEPALIVE_TIMEOUT_SECS,
+                enable_cleanup_closed=True,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=self.connector, timeout=self.timeout
+            )
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and its connection pool."""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    @staticmethod
+    def _error_weather(
+        city: str, description: str, error: str, timestamp: str
+    ) -> WeatherData:
+        """Build a placeholder WeatherData for a failed fetch."""
+        return WeatherData(
+            city=city,
+            temperature=0,
+            description=description,
+            humidity=0,
+            pressure=0,
+            wind_speed=0,
+            country="",
+            timestamp=timestamp,
+            error=error,
+        )
+
+    def _get_cached(self, city: str) -> WeatherData | None:
+        """Return the cached weather for a city if it has not expired."""
+        entry = self._cache.get(city)
+        if entry and time.monotonic() - entry[0] < CACHE_TTL_SECS:
+            return entry[1]
+        return None
 
     async def fetch_weather(
-        self, session: aiohttp.ClientSession, city: str
-    ) -> WeatherData | dict:
-        """Fetch weather data for a specific city."""
-        start_time = time.time()
+        self, session: aiohttp.ClientSession, city: str, timestamp: str
+    ) -> WeatherData:
+        """Fetch weather data for a specific city, using the cache if fresh."""
+        # Cache hits skip both the network and the rate limiter
+        cached = self._get_cached(city)
+        if cached is not None:
+            return cached
+
+        task = self._in_flight.get(city)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(session, city, timestamp))
+            self._in_flight[city] = task
+
+        # Shield the shared fetch, so one caller timing out does not cancel it
+        # for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(
+        self, session: aiohttp.ClientSession, city: str, timestamp: str
+    ) -> WeatherData:
+        """Request weather for a city and cache it if the fetch succeeded."""
+        try:
+            weather_data = await self._request_weather(session, city, timestamp)
+            if weather_data.error is None:
+                self._cache[city] = (time.monotonic(), weather_data)
+            return weather_data
+        finally:
+            self._in_flight.pop(city, None)
+
+    async def _request_weather(
+        self, session: aiohttp.ClientSession, city: str, timestamp: str
+    ) -> WeatherData:
+        """Request weather data for a specific city from the API."""
+        # Per-city timings are only collected when debugging
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            start_time = time.time()
 
         try:
             # Check rate limit
-            if not self.rate_limiter.is_allowed():
+            if not await self.rate_limiter.is_allowed():
                 logger.warning(f"Rate limit reached while feching '{city}'")
-                return WeatherData(
-                    city=city,
-                    temperature=0,
-                    description="Rate limit exceeded",
-                    humidity=0,
-                    pressure=0,
-                    wind_speed=0,
-                    country="",
-                    timestamp=datetime.now().isoformat(),
-                    error="Rate limit exceeded",
+                return self._error_weather(
+                    city, "Rate limit exceeded", "Rate limit exceeded", timestamp
                 )
 
-            params = {"q": city, "appid": self.api_key, "units": "metric"}
-
-            async with session.get(
-                self.base_url, params=params, timeout=self.timeout
+            # Bound in-flight upstream calls
+            url = self._url_prefix + quote_plus(city)
+            async with self._upstream_semaphore, session.get(
+                url, timeout=self.timeout
             ) as response:
                 if response.status == 200:  # HTTP 200 OK
-                    data = await response.json()
+                    data = await response.json(loads=orjson.loads, content_type=None)
+                    main = data["main"]
+                    # Keep the API's canonical city name rather than the query
                     weather_data = WeatherData(
                         city=data["name"],
-                        temperature=data["main"]["temp"],
+                        temperature=main["temp"],
                         description=data["weather"][0]["description"],
-                        humidity=data["main"]["humidity"],
-                        pressure=data["main"]["pressure"],
+                        humidity=main["humidity"],
+                        pressure=main["pressure"],
                         wind_speed=data["wind"]["speed"],
                         country=data["sys"]["country"],
-                        timestamp=datetime.now().isoformat(),
+                        timestamp=timestamp,
                     )
 
                     # Log performance metrics
-                    duration = time.time() - start_time
-
-                    logger.info(
-                        f"Successfully fetched weather for {city} in {duration:.2f}s"
-                    )
+                    if debug:
+                        duration = time.time() - start_time
+                        logger.debug(
+                            f"Successfully fetched weather for {city} "
+                            f"in {duration:.2f}s"
+                        )
 
                     return weather_data
                 else:
                     error_msg = f"API returned status {response.status}"
                     logger.error(f"Failed to fetch weather for {city}: {error_msg}")
 
-                    return WeatherData(
-                        city=city,
-                        temperature=0,
-                        description="API Error",
-                        humidity=0,
-                        pressure=0,
-                        wind_speed=0,
-                        country="",
-                        timestamp=datetime.now().isoformat(),
-                        error=error_msg,
-                    )
+                    return self._error_weather(city, "API Error", error_msg, timestamp)
 
         except asyncio.TimeoutError:
             logger.error(f"Timeout occurred while fetching weather for {city}")
-            return WeatherData(
-                city=city,
-                temperature=0,
-                description="Request timeout",
-                humidity=0,
-                pressure=0,
-                wind_speed=0,
-                country="",
-                timestamp=datetime.now().isoformat(),
-                error="Request timeout",
+            return self._error_weather(
+                city, "Request timeout", "Request timeout", timestamp
             )
         except Exception as e:
             logger.error(f"Unexpected error fetching weather for {city}: {str(e)}")
-            return WeatherData(
-                city=city,
-                temperature=0,
-                description="Service unavailable",
-                humidity=0,
-                pressure=0,
-                wind_speed=0,
-                country="",
-                timestamp=datetime.now().isoformat(),
-                error=str(e),
-            )
+            return self._error_weather(city, "Service unavailable", str(e), timestamp)
 
     async def fetch_cities_list(self, cities: list[str]) -> list[WeatherData]:
         """Fetch weather data for multiple cities concurrently."""
         start_time = time.time()
 
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.fetch_weather(session, city) for city in cities]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        # The batch is effectively simultaneous, so it shares one timestamp
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-            # Handle any exceptions that occurred
-            weather_data = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    logger.error(
-                        f"Exception occurred for city {cities[i]}: {str(result)}"
-                    )
-                    weather_data.append(
-                        WeatherData(
-                            city=cities[i],
-                            temperature=0,
-                            description="Service error",
-                            humidity=0,
-                            pressure=0,
-                            wind_speed=0,
-                            country="",
-                            timestamp=datetime.now().isoformat(),
-                            error=str(result),
-                        )
-                    )
-                else:
-                    weather_data.append(result)
+        await self.start()
 
-            total_duration = time.time() - start_time
-            logger.info(
-                f"Fetched weather for {len(cities)} cities in {total_duration:.2f}s"
-            )
+        tasks = [self.fetch_weather(self.session, city, timestamp) for city in cities]
+        # fetch_weather guarantees no raises, errors come back as WeatherData
+        weather_data = await asyncio.gather(*tasks)
 
-            return weather_data
+        total_duration = time.time() - start_time
+        logger.info(
+            f"Fetched weather for {len(cities)} cities in {total_duration:.2f}s"
+        )
+
+        return weather_data
 
 
 # Initialize weather service
@@ -228,8 +321,27 @@ API_KEY = os.getenv("OPENWEATHER_API_KEY", "REPLACE_WITH_YOUR_API_KEY")
 weather_service = WeatherService(API_KEY)
 
 
+def json_response(payload: dict, status: int = 200):
+    """Serialize a payload with orjson, faster than the stdlib encoder."""
+    return app.response_class(
+        orjson.dumps(payload), status=status, mimetype="application/json"
+    )
+
+
+@app.before_serving
+async def startup() -> None:
+    """Create the shared HTTP session on the server's event loop."""
+    await weather_service.start()
+
+
+@app.after_serving
+async def shutdown() -> None:
+    """Release pooled connections when the server stops."""
+    await weather_service.close()
+
+
 @app.route("/")
-def index():
+async def index():
     """API endpoint to get weather data."""
     # Here we will fetch the weather data for multiple cities concurrently
 
@@ -238,42 +350,41 @@ def index():
     cities = ["Mexico City", "San Francisco", "London"]
 
     try:
-        # Create a new event loop for the async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        weather_data = loop.run_until_complete(
-            weather_service.fetch_cities_list(cities)
+        weather_data = await asyncio.wait_for(
+            weather_service.fetch_cities_list(cities), timeout=REQUEST_TIMEOUT_SECS
         )
-        loop.close()
 
         # Prepare the JSON response
         # TODO: Add units!
         # TODO: This could be done with a Serializer,
         # depending on the framework such as Django REST or FastAPI.
         weather_dict = [
-            {
-                "city": data.city,
-                "temperature": data.temperature,
-                "description": data.description,
-                "humidity": data.humidity,
-                "pressure": data.pressure,
-                "wind_speed": data.wind_speed,
-                "country": data.country,
-                "timestamp": data.timestamp,
-            }
-            for data in weather_data
+            dict(zip(PUBLIC_FIELDS, get_public_fields(data))) for data in weather_data
         ]
 
         # Return the result as a JSON response
-        return jsonify(
+        return json_response(
             {"status": "success", "data": weather_dict, "records": len(weather_dict)}
         )
 
+    except asyncio.TimeoutError:
+        logger.error(f"Weather endpoint timed out after {REQUEST_TIMEOUT_SECS}s")
+        return json_response(
+            {"status": "error", "message": "Upstream request timed out"}, status=504
+        )
     except Exception as e:
         logger.error(f"Error in weather endpoint: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return json_response({"status": "error", "message": str(e)}, status=500)
 
 
 if __name__ == "__main__":
+    # hypercorn picks uvloop through `--worker-class uvloop`, the dev server
+    # needs the policy set here. uvloop is not available on Windows.
+    try:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     app.run(host="localhost", port=int(os.environ.get("PORT", 8080)), debug=True)
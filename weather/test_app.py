@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from app import WeatherService
+
+
+def test_concurrent_failures_share_one_upstream_call(monkeypatch):
+    """Waiters on a failing city reuse the in-flight result, not retry it."""
+    service = WeatherService("test-key")
+    calls = 0
+
+    async def failing_request(session, city, timestamp):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return service._error_weather(
+            city, "API Error", "API returned status 500", timestamp
+        )
+
+    monkeypatch.setattr(service, "_request_weather", failing_request)
+
+    async def fetch_concurrently():
+        return await asyncio.gather(
+            *(service.fetch_weather(None, "London", "ts") for _ in range(5))
+        )
+
+    start_time = time.monotonic()
+    results = asyncio.run(fetch_concurrently())
+    duration = time.monotonic() - start_time
+
+    assert calls == 1
+    assert duration < 0.4
+    assert all(r.error == "API returned status 500" for r in results)
+    # Errors are not cached, so the next request retries upstream
+    assert service._in_flight == {}
+    assert service._get_cached("London") is None